@@ -14,11 +14,35 @@ import json
 import hashlib
 import argparse
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 import time
 import sys
 import signal
 import re
-from datetime import datetime, timezone
+import mmap
+import sqlite3
+import select
+from array import array
+from collections import Counter, deque
+from functools import partial
+from itertools import filterfalse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+from datetime import datetime, timedelta, timezone
+
+try:
+    # optional: BLAKE3 is several times faster than SHA-256 and threads internally
+    from blake3 import blake3 as _blake3
+    HASH_ALGO = "blake3"
+except ImportError:
+    _blake3 = None
+    HASH_ALGO = "sha256"
+
+try:
+    # optional: Rust-based JSON, several times faster than the stdlib module
+    import orjson
+except ImportError:
+    orjson = None
 
 # -----------------------------
 # Helpers for masking
@@ -85,6 +109,24 @@ def mask_path_for_output(path):
         return "<REDACTED_PATH>"
 
 
+# -----------------------------
+# JSON helpers (orjson when installed, stdlib json otherwise)
+# -----------------------------
+
+def json_loads(data):
+    # accepts str or bytes
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_dumps(obj, indent=False):
+    # returns UTF-8 bytes
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None).encode("utf-8")
+
+
 # -----------------------------
 # Configuration (from env; masked in outputs)
 # -----------------------------
@@ -93,12 +135,25 @@ KMS_KEY_ARN = os.environ.get("KMS_KEY_ARN") or "<REDACTED_KMS_ARN>"
 SNS_TOPIC_ARN = os.environ.get("SNS_TOPIC_ARN") or None
 AWS_REGION = os.environ.get("AWS_REGION", "us-east-1")
 
+# secret -> mask, applied to every log line in a single regex pass (longest first
+# so a value containing another is masked whole)
+_REDACT_MAP = {
+    v: mask
+    for v, mask in (
+        (S3_BUCKET, mask_bucket(S3_BUCKET)),
+        (KMS_KEY_ARN, mask_arn(KMS_KEY_ARN)),
+        (SNS_TOPIC_ARN, "<REDACTED_SNS>"),
+    )
+    if v
+}
+_REDACT_RE = re.compile("|".join(re.escape(k) for k in sorted(_REDACT_MAP, key=len, reverse=True))) if _REDACT_MAP else None
+
 # SOURCE_DRIVES_JSON example: '{"C:\\\\": "MAIN", "E:\\\\": "Black Hard Drive"}'
 SOURCE_DRIVES = {}
 try:
     sdj = os.environ.get("SOURCE_DRIVES_JSON")
     if sdj:
-        SOURCE_DRIVES = json.loads(sdj)
+        SOURCE_DRIVES = json_loads(sdj)
 except Exception:
     SOURCE_DRIVES = {}
 
@@ -108,19 +163,49 @@ if not SOURCE_DRIVES:
         "C:\\": "MAIN"
     }
 
+# candidates refer to drives by index into this table (see gather_candidate_files)
+DRIVE_NAMES = list(SOURCE_DRIVES.values())
+
 # Local state files
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-HASH_DB_FILE = os.path.join(BASE_DIR, "backup_hashes.json")
+HASH_DB_FILE = os.path.join(BASE_DIR, "backup_hashes.sqlite")
+LEGACY_HASH_DB_FILE = os.path.join(BASE_DIR, "backup_hashes.json")
+HASH_DB_COMMIT_EVERY = 1000
 LOG_FILE = os.path.join(BASE_DIR, "backup_log.txt")
 
-# AWS clients (created with region; credentials come from environment/profile/role)
-s3 = boto3.client("s3", region_name=AWS_REGION)
-sns = boto3.client("sns", region_name=AWS_REGION)
-
-CHUNK_SIZE = 64 * 1024  # 64KB
+# multipart settings for large media files (parts are uploaded concurrently)
+TRANSFER_CFG = TransferConfig(
+    multipart_threshold=16 << 20,
+    multipart_chunksize=64 << 20,
+    max_concurrency=16,
+    use_threads=True,
+)
+UPLOAD_WORKERS = 32
+
+# AWS clients (created with region; credentials come from environment/profile/role).
+# every concurrent upload_file runs its own transfer manager with up to
+# max_concurrency part uploads, so the pool holds a connection for each of them
+# (botocore's default is 10 and extra connections are opened and thrown away);
+# keepalive reuses TLS connections, and adaptive retries back off on throttling
+_BOTO_CFG = Config(
+    max_pool_connections=UPLOAD_WORKERS * TRANSFER_CFG.max_concurrency,
+    retries={"mode": "adaptive", "max_attempts": 10},
+    tcp_keepalive=True,
+    s3={"addressing_style": "virtual"},
+)
+s3 = boto3.client("s3", region_name=AWS_REGION, config=_BOTO_CFG)
+sns = boto3.client("sns", region_name=AWS_REGION, config=_BOTO_CFG)
+cloudwatch = boto3.client("cloudwatch", region_name=AWS_REGION, config=_BOTO_CFG)
+
+CHUNK_SIZE = 1 << 20  # 1MB
+MMAP_THRESHOLD = 16 << 20  # files at least this large are hashed via mmap
+MMAP_SLICE = 64 << 20  # bounds how much of a mapped file is touched per update
+HASH_WORKERS = os.cpu_count() or 4
 PRICE_PER_GB_DEEP_ARCHIVE = 0.00099  # USD per GB-month
 PREWARN_SECONDS = 5 * 60
+PROGRESS_INTERVAL_SECONDS = 1.0
 _interrupted = False
+_log_fh = None  # kept open by backup_run for the length of a run
 
 
 # -----------------------------
@@ -130,17 +215,18 @@ _interrupted = False
 def safe_log(msg):
     # mask common configurable sensitive values before printing
     try:
-        masked = msg.replace(S3_BUCKET, mask_bucket(S3_BUCKET) if S3_BUCKET else "<REDACTED_BUCKET>")
-        masked = masked.replace(KMS_KEY_ARN, mask_arn(KMS_KEY_ARN) if KMS_KEY_ARN else "<REDACTED_KMS_ARN>")
-        masked = masked.replace(SNS_TOPIC_ARN or "", "<REDACTED_SNS>")
+        masked = _REDACT_RE.sub(lambda m: _REDACT_MAP[m.group(0)], msg) if _REDACT_RE else msg
     except Exception:
         masked = msg
     ts = datetime.now(timezone.utc).astimezone().isoformat()
     line = f"{ts} {masked}"
     print(line)
     try:
-        with open(LOG_FILE, "a", encoding="utf-8") as fh:
-            fh.write(line + "\n")
+        if _log_fh is not None:
+            _log_fh.write(line + "\n")
+        else:
+            with open(LOG_FILE, "a", encoding="utf-8") as fh:
+                fh.write(line + "\n")
     except Exception:
         pass
 
@@ -152,26 +238,241 @@ def safe_log(msg):
 def compute_sha256(path):
     h = hashlib.sha256()
     with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    view = memoryview(mm)
+                    try:
+                        for i in range(0, len(mm), MMAP_SLICE):
+                            h.update(view[i:i + MMAP_SLICE])
+                    finally:
+                        view.release()
+                return h.hexdigest()
+            except (OSError, ValueError):
+                # mmap unsupported here (e.g. network share); fall back to reads
+                h = hashlib.sha256()
+                f.seek(0)
         for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
             h.update(chunk)
     return h.hexdigest()
 
 
-def load_hash_db():
-    if os.path.exists(HASH_DB_FILE):
+def compute_content_hash(path):
+    # content-identity key for dedup and change detection (HASH_ALGO)
+    if _blake3 is None:
+        return compute_sha256(path)
+    h = _blake3(max_threads=_blake3.AUTO)
+    h.update_mmap(path)
+    return h.hexdigest()
+
+
+class HashingReader:
+    # read-only wrapper that hashes exactly the bytes boto3 reads. it has no
+    # seek/tell, so s3transfer treats it as a stream and reads it front to back
+    def __init__(self, f):
+        self.f = f
+        self.h = _blake3() if _blake3 is not None else hashlib.sha256()
+
+    def read(self, n=-1):
+        b = self.f.read(n)
+        self.h.update(b)
+        return b
+
+
+def upload_and_hash(abs_path, s3_key, extra_args):
+    # single read of the file: upload it and return the HASH_ALGO hash of what was sent
+    with open(abs_path, "rb") as f:
+        reader = HashingReader(f)
+        s3.upload_fileobj(reader, S3_BUCKET, s3_key, ExtraArgs=extra_args, Config=TRANSFER_CFG)
+    return reader.h.hexdigest()
+
+
+def cached_fingerprint(size, mtime_ns, prev, size_is_unique=False):
+    # the part of fingerprint_file that needs no file I/O: the fingerprint when the
+    # hash DB (or a unique size) settles it, otherwise None (the file must be read)
+    entry = prev if isinstance(prev, list) and len(prev) == 3 else None
+    if entry and entry[0] == size and entry[1] == mtime_ns:
+        if entry[2] is None and not size_is_unique:
+            return None
+        return size, mtime_ns, entry[2], True
+    if isinstance(prev, str):
+        return None
+    if size_is_unique and not (entry and entry[0] == size and entry[2] is not None):
+        return size, mtime_ns, None, False
+    return None
+
+
+def fingerprint_file(path, size, mtime_ns, prev, size_is_unique=False):
+    # size/mtime come from the pre-scan; reuse the stored hash when they match.
+    # hash DB entries are [size, mtime_ns, hash] (older DBs hold a bare sha256);
+    # hash is None when it was never needed, see size_is_unique below
+    cached = cached_fingerprint(size, mtime_ns, prev, size_is_unique)
+    if cached is not None:
+        return cached
+    entry = prev if isinstance(prev, list) and len(prev) == 3 else None
+    if entry and entry[0] == size and entry[1] == mtime_ns:
+        # no usable stored hash (other algorithm, or skipped as unique before)
+        # and another candidate shares this size, so store one to compare
+        # against if this file is touched later
+        return size, mtime_ns, compute_content_hash(path), True
+    if isinstance(prev, str) and HASH_ALGO != "sha256" and compute_sha256(path) == prev:
+        return size, mtime_ns, compute_content_hash(path), True
+    # changed or new: a size no other candidate has can't be an in-run duplicate,
+    # so only hash it if there is a stored hash of the same size to compare with
+    comparable = (isinstance(prev, str) and HASH_ALGO == "sha256") or (entry and entry[0] == size and entry[2] is not None)
+    if size_is_unique and not comparable:
+        return size, mtime_ns, None, False
+    return size, mtime_ns, compute_content_hash(path), False
+
+
+def _resolve_fingerprint(item):
+    abs_path, drive_name, fingerprint, fut = item
+    if fut is None:
+        return abs_path, drive_name, fingerprint, None
+    try:
+        return abs_path, drive_name, fut.result(), None
+    except Exception as e:
+        return abs_path, drive_name, None, e
+
+
+def iter_hashed_candidates(candidates, persisted_hashes, size_counts):
+    # yield (abs_path, drive_name, (size, mtime_ns, hash, presumed_unchanged), error)
+    # in candidate order. cache hits are settled inline; only files that must be
+    # read go to the thread pool (hashlib releases the GIL), at most
+    # 2 * HASH_WORKERS at a time, with later cache hits held behind them in order.
+    paths, sizes, mtimes, drive_ids = candidates
+    window = deque()  # (abs_path, drive_name, fingerprint or None, future or None)
+    inflight = 0
+
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
         try:
-            with open(HASH_DB_FILE, "r", encoding="utf-8") as fh:
-                return json.load(fh)
+            for i, abs_path in enumerate(paths):
+                if _interrupted:
+                    break
+                size = sizes[i]
+                mtime_ns = mtimes[i]
+                drive_name = DRIVE_NAMES[drive_ids[i]]
+                prev = persisted_hashes.get(abs_path)
+                size_is_unique = size_counts[size] == 1
+                cached = cached_fingerprint(size, mtime_ns, prev, size_is_unique)
+                if cached is not None:
+                    if not window:
+                        yield abs_path, drive_name, cached, None
+                        continue
+                    window.append((abs_path, drive_name, cached, None))
+                else:
+                    fut = pool.submit(fingerprint_file, abs_path, size, mtime_ns, prev, size_is_unique)
+                    window.append((abs_path, drive_name, None, fut))
+                    inflight += 1
+                # block on the oldest hash only when the pool is saturated (or too
+                # many cache hits are queued behind it); otherwise yield what's ready
+                while window and (
+                    inflight >= 2 * HASH_WORKERS
+                    or len(window) >= 64 * HASH_WORKERS
+                    or window[0][3] is None
+                    or window[0][3].done()
+                ):
+                    item = window.popleft()
+                    if item[3] is not None:
+                        inflight -= 1
+                    yield _resolve_fingerprint(item)
+            while window:
+                yield _resolve_fingerprint(window.popleft())
+        finally:
+            # consumer stopped early: drop hashes that haven't started
+            for item in window:
+                if item[3] is not None:
+                    item[3].cancel()
+
+
+def _read_legacy_hash_db():
+    # pre-SQLite layout: {"algo": ..., "files": {path: [size, mtime_ns, hash]}}
+    # (the oldest DBs are a bare {path: ...} of sha256 values). returns (algo, files)
+    if os.path.exists(LEGACY_HASH_DB_FILE):
+        try:
+            with open(LEGACY_HASH_DB_FILE, "rb") as fh:
+                data = json_loads(fh.read())
         except Exception:
+            return HASH_ALGO, {}
+        if not isinstance(data, dict):
+            return HASH_ALGO, {}
+        if isinstance(data.get("files"), dict):
+            return data.get("algo", "sha256"), data["files"]
+        return "sha256", data
+    return HASH_ALGO, {}
+
+
+def open_hash_db(dry_run=False):
+    # SQLite in WAL mode: rows are written as files are processed, so an
+    # interrupted run keeps its progress. a dry run never creates or changes it
+    # (returns None when there is no DB yet). raises sqlite3.Error if the DB
+    # can't be opened or set up; a corrupt file is first renamed aside so the
+    # next run starts a fresh DB.
+    if dry_run:
+        return sqlite3.connect(HASH_DB_FILE) if os.path.exists(HASH_DB_FILE) else None
+    conn = None
+    try:
+        conn = sqlite3.connect(HASH_DB_FILE)
+        _init_hash_db(conn)
+    except sqlite3.Error as e:
+        if conn is not None:
+            conn.close()
+        if type(e) is sqlite3.DatabaseError and os.path.exists(HASH_DB_FILE):
+            # "file is not a database" / "malformed": not a transient error like a lock
+            try:
+                os.replace(HASH_DB_FILE, HASH_DB_FILE + ".corrupt")
+                for suffix in ("-wal", "-shm"):
+                    if os.path.exists(HASH_DB_FILE + suffix):
+                        os.replace(HASH_DB_FILE + suffix, HASH_DB_FILE + ".corrupt" + suffix)
+            except OSError:
+                pass
+        raise
+    return conn
+
+
+def _init_hash_db(conn):
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS hashes(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, hash TEXT)")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta(key TEXT PRIMARY KEY, value TEXT)")
+    row = conn.execute("SELECT value FROM meta WHERE key = 'algo'").fetchone()
+    if row is None:
+        # new DB: carry over the JSON hash DB from earlier versions, if any
+        algo, files = _read_legacy_hash_db()
+        conn.executemany(
+            "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)",
+            ((p, e[0], e[1], e[2]) if isinstance(e, list) and len(e) == 3 else (p, None, None, e) for p, e in files.items())
+        )
+        conn.execute("INSERT INTO meta VALUES ('algo', ?)", (algo,))
+        row = (algo,)
+    if row[0] != HASH_ALGO:
+        # hashes from another algorithm can't be compared; keep size/mtime so
+        # unchanged files are re-hashed lazily instead of re-uploaded
+        conn.execute("UPDATE hashes SET hash = NULL WHERE size IS NOT NULL")
+        conn.execute("UPDATE meta SET value = ? WHERE key = 'algo'", (HASH_ALGO,))
+    conn.commit()
+
+
+def load_hash_db(conn):
+    # {path: [size, mtime_ns, hash]}; rows carried over from the oldest JSON DBs
+    # are a bare sha256 instead
+    if conn is None:
+        algo, files = _read_legacy_hash_db()
+    else:
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'algo'").fetchone()
+            algo = row[0] if row else HASH_ALGO
+            files = {
+                p: ([size, mtime_ns, h] if size is not None else h)
+                for p, size, mtime_ns, h in conn.execute("SELECT path, size, mtime_ns, hash FROM hashes")
+            }
+        except sqlite3.Error:
             return {}
-    return {}
-
-
-def save_hash_db_atomic(db):
-    tmp = HASH_DB_FILE + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as fh:
-        json.dump(db, fh, indent=2)
-    os.replace(tmp, HASH_DB_FILE)
+    if algo != HASH_ALGO:
+        # only reached in a dry run; open_hash_db does this in the DB otherwise
+        files = {p: ([e[0], e[1], None] if isinstance(e, list) and len(e) == 3 else e) for p, e in files.items()}
+    return files
 
 
 def human_readable_size(bytes_count):
@@ -182,16 +483,52 @@ def human_readable_size(bytes_count):
     return f"{bytes_count:.2f} TB"
 
 
+def get_bucket_size_bytes():
+    # S3 publishes BucketSizeBytes to CloudWatch daily at no cost; only list every
+    # object (one LIST per 1000 keys) when there is no datapoint to use
+    try:
+        now = datetime.now(timezone.utc)
+        resp = cloudwatch.get_metric_statistics(
+            Namespace="AWS/S3",
+            MetricName="BucketSizeBytes",
+            Dimensions=[
+                {"Name": "BucketName", "Value": S3_BUCKET},
+                {"Name": "StorageType", "Value": "DeepArchiveStorage"}
+            ],
+            StartTime=now - timedelta(days=2),
+            EndTime=now,
+            Period=86400,
+            Statistics=["Average"]
+        )
+        datapoints = resp.get("Datapoints", [])
+        if datapoints:
+            return int(max(datapoints, key=lambda d: d["Timestamp"])["Average"])
+    except Exception as e:
+        safe_log(f"CloudWatch bucket size unavailable, listing objects instead: {str(e)}")
+
+    total_bytes_bucket = 0
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=S3_BUCKET):
+        for obj in page.get("Contents", []):
+            total_bytes_bucket += obj.get("Size", 0)
+    return total_bytes_bucket
+
+
 # -----------------------------
 # Path helpers (keeps original behavior but avoids exposing raw paths in output)
 # -----------------------------
 
-def path_is_excluded(full_path, exclude_parts):
-    p = os.path.normcase(os.path.abspath(full_path))
-    for part in exclude_parts:
-        if part.lower() in p.lower():
-            return True
-    return False
+def path_is_excluded(full_path, checked_len=0):
+    # full_path must already be normcase(abspath(...)). checked_len is the length
+    # of a prefix known not to match (e.g. the parent dir), so it isn't rescanned.
+    return _EXCL_RE.search(full_path, max(0, checked_len - _EXCL_OVERLAP)) is not None
+
+
+def _filter_paths(paths, checked_len=0):
+    # batch path_is_excluded for the entries of one directory: filterfalse over a
+    # bound regex search keeps the per-path loop in C rather than in bytecode
+    search = partial(_EXCL_RE.search, pos=max(0, checked_len - _EXCL_OVERLAP))
+    return list(filterfalse(search, paths))
 
 
 def build_allowed_paths_for_source(source_root, allowed_folder_names, explicit_paths):
@@ -239,6 +576,38 @@ def _signal_handler(signum, frame):
     safe_log(f"Received signal {signum}; marking interrupted.")
 
 
+def wait_for_interrupt(seconds):
+    # sleep up to `seconds`, returning True early once a signal marks the run
+    # interrupted. the handler must not take a lock (it can run while this
+    # thread holds one), so nothing here waits on one: on POSIX a signal wakes
+    # a select() on the wakeup fd at once; Windows polls in 1s slices.
+    # main thread only (set_wakeup_fd).
+    deadline = time.monotonic() + seconds
+    if os.name == "nt":
+        while not _interrupted:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(remaining, 1.0))
+        return _interrupted
+    r, w = os.pipe()
+    os.set_blocking(r, False)
+    os.set_blocking(w, False)
+    old_wakeup_fd = signal.set_wakeup_fd(w)
+    try:
+        while not _interrupted:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if select.select([r], [], [], remaining)[0]:
+                os.read(r, 512)
+    finally:
+        signal.set_wakeup_fd(old_wakeup_fd)
+        os.close(r)
+        os.close(w)
+    return _interrupted
+
+
 signal.signal(signal.SIGINT, _signal_handler)
 try:
     signal.signal(signal.SIGTERM, _signal_handler)
@@ -263,40 +632,141 @@ EXCLUDE_PATH_PARTS = [
     r"\\Recovery",
     r"\\PerfLogs"
 ]
+# one case-insensitive scan per path instead of a substring test per part
+_EXCL_RE = re.compile("|".join(re.escape(p) for p in EXCLUDE_PATH_PARTS), re.IGNORECASE)
+_EXCL_OVERLAP = max(len(p) for p in EXCLUDE_PATH_PARTS) - 1
 
 
-def gather_candidate_files():
-    candidates = []
-    drive_present = {}
-    for source, drive_name in SOURCE_DRIVES.items():
-        present = os.path.exists(source)
-        drive_present[drive_name] = present
-        if not present:
-            safe_log(f"Drive root missing for pre-scan: {mask_path_for_output(source)}")
+def _scan_tree(root_norm):
+    # os.scandir walk yielding (path, size, mtime_ns). DirEntry caches its stat
+    # (and its type on most platforms), so no file is stat'ed again later.
+    # root_norm must already be normalized and checked against the excludes.
+    prefix = root_norm if root_norm.endswith(os.sep) else root_norm + os.sep
+    subdirs = []
+    try:
+        with os.scandir(root_norm) as it:
+            entries = {prefix + os.path.normcase(de.name): de for de in it}
+    except OSError:
+        # unreadable, or failed mid-listing (EIO, drive dropped): skip this
+        # directory and keep scanning, as os.walk does
+        return
+    for path in _filter_paths(entries, len(root_norm)):
+        de = entries[path]
+        try:
+            if de.is_dir():
+                # like os.walk, don't descend into symlinked directories
+                if not de.is_symlink():
+                    subdirs.append(path)
+                continue
+            st = de.stat()
+        except OSError:
             continue
-
-        allowed_roots = build_allowed_paths_for_source(source, ALLOWED_FOLDER_NAMES, EXPLICIT_ABSOLUTE_PATHS)
-        if not allowed_roots:
-            safe_log(f"No allowed roots found under {mask_path_for_output(source)}")
+        yield path, st.st_size, st.st_mtime_ns
+    for sub in subdirs:
+        yield from _scan_tree(sub)
+
+
+def _walk_source(source):
+    # pre-scan one SOURCE_DRIVES root; returns (present, paths, sizes, mtimes)
+    paths = []
+    sizes = array("q")
+    mtimes = array("q")
+    if not os.path.exists(source):
+        safe_log(f"Drive root missing for pre-scan: {mask_path_for_output(source)}")
+        return False, paths, sizes, mtimes
+
+    allowed_roots = build_allowed_paths_for_source(source, ALLOWED_FOLDER_NAMES, EXPLICIT_ABSOLUTE_PATHS)
+    if not allowed_roots:
+        safe_log(f"No allowed roots found under {mask_path_for_output(source)}")
+        return True, paths, sizes, mtimes
+
+    for root_allowed in allowed_roots:
+        root_norm = os.path.normcase(root_allowed)
+        if path_is_excluded(root_norm):
             continue
+        for file_path, size, mtime_ns in _scan_tree(root_norm):
+            paths.append(file_path)
+            sizes.append(size)
+            mtimes.append(mtime_ns)
+    return True, paths, sizes, mtimes
 
-        for root_allowed in allowed_roots:
-            for root, dirs, files in os.walk(root_allowed):
-                dirs[:] = [d for d in dirs if not path_is_excluded(os.path.join(root, d), EXCLUDE_PATH_PARTS)]
-                for fname in files:
-                    file_path = os.path.join(root, fname)
-                    if path_is_excluded(file_path, EXCLUDE_PATH_PARTS):
-                        continue
-                    candidates.append((os.path.normcase(os.path.abspath(file_path)), drive_name))
-    return candidates, drive_present
+
+def gather_candidate_files():
+    # candidates are parallel arrays (paths, sizes, mtimes_ns, drive_ids) rather
+    # than a list of tuples: far fewer Python objects on multi-million-file scans.
+    # drive_ids index DRIVE_NAMES.
+    # drives are separate devices, so they are walked concurrently (scandir and
+    # stat release the GIL); results are merged in SOURCE_DRIVES order to keep
+    # the candidate order, and so the dedup outcome, stable between runs.
+    paths = []
+    sizes = array("q")
+    mtimes = array("q")
+    drive_ids = array("B")
+    drive_present = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(SOURCE_DRIVES))) as pool:
+        futures = [
+            pool.submit(_walk_source, source) for source in SOURCE_DRIVES
+        ]
+        for drive_id, fut in enumerate(futures):
+            present, drive_paths, drive_sizes, drive_mtimes = fut.result()
+            drive_present[DRIVE_NAMES[drive_id]] = present
+            paths.extend(drive_paths)
+            sizes.extend(drive_sizes)
+            mtimes.extend(drive_mtimes)
+            drive_ids.extend(array("B", [drive_id]) * len(drive_paths))
+    return (paths, sizes, mtimes, drive_ids), drive_present
+
+
+def dedupe_candidates(candidates):
+    # one candidate per path (first wins), e.g. when configured roots overlap;
+    # the main loop relies on this instead of tracking seen paths
+    paths, sizes, mtimes, drive_ids = candidates
+    first_index = {}
+    for i, p in enumerate(paths):
+        first_index.setdefault(p, i)
+    if len(first_index) == len(paths):
+        return candidates
+    keep = list(first_index.values())
+    return (
+        [paths[i] for i in keep],
+        array("q", (sizes[i] for i in keep)),
+        array("q", (mtimes[i] for i in keep)),
+        array("B", (drive_ids[i] for i in keep)),
+    )
 
 
 def backup_run(dry_run=False):
-    start_time = time.time()
-    start_dt_utc = datetime.utcnow().replace(tzinfo=timezone.utc).isoformat()
+    # keep one buffered handle on the log file for the run instead of
+    # reopening it for every line
+    global _log_fh
+    try:
+        _log_fh = open(LOG_FILE, "a", encoding="utf-8", buffering=1 << 16)
+    except Exception:
+        _log_fh = None
+    try:
+        return _backup_run(dry_run)
+    finally:
+        if _log_fh is not None:
+            fh, _log_fh = _log_fh, None
+            fh.close()
+
 
-    persisted_hashes = load_hash_db()
-    updated_hashes = dict(persisted_hashes)
+def _backup_run(dry_run=False):
+    start_time = time.monotonic()
+    start_dt_utc = datetime.now(timezone.utc).isoformat()
+
+    # a broken hash DB must never block a backup: fall back to the legacy JSON
+    # DB (or nothing) and upload without recording hashes this run
+    hash_db_error = None
+    try:
+        hash_db = open_hash_db(dry_run)
+    except sqlite3.Error as e:
+        hash_db, hash_db_error = None, e
+    persisted_hashes = load_hash_db(hash_db)
+    if dry_run and hash_db is not None:
+        hash_db.close()
+        hash_db = None
+    uncommitted_hashes = 0
 
     uploaded_keys = []
     duplicate_skips = []
@@ -304,27 +774,28 @@ def backup_run(dry_run=False):
     run_manifest = {
         "run_start_utc": start_dt_utc,
         "dry_run": bool(dry_run),
+        "hash_algo": HASH_ALGO,
         "uploaded": [],
         "skipped_duplicates": [],
         "errors": [],
         "estimates": {},
     }
+    if hash_db_error is not None:
+        safe_log(f"Could not open hash DB, continuing without it: {str(hash_db_error)}")
+        run_manifest["errors"].append({"open_hash_db": str(hash_db_error)})
 
     safe_log("Starting pre-scan for estimation...")
     candidates, drive_present = gather_candidate_files()
-    candidates = list(dict.fromkeys(candidates))
-    total_files = len(candidates)
-    total_bytes = 0
+    candidates = dedupe_candidates(candidates)
+    paths, sizes, mtimes, drive_ids = candidates
+    total_files = len(paths)
+    total_bytes = sum(sizes)
     drive_totals = {v: 0 for v in SOURCE_DRIVES.values()}
     drive_uploaded = {v: 0 for v in SOURCE_DRIVES.values()}
 
-    for path, dn in candidates:
-        drive_totals.setdefault(dn, 0)
-        drive_totals[dn] += 1
-        try:
-            total_bytes += os.path.getsize(path)
-        except Exception:
-            pass
+    for drive_id, count in Counter(drive_ids).items():
+        drive_totals[DRIVE_NAMES[drive_id]] += count
+    size_counts = Counter(sizes)
 
     run_manifest["estimates"]["total_files"] = total_files
     run_manifest["estimates"]["total_bytes"] = total_bytes
@@ -333,152 +804,239 @@ def backup_run(dry_run=False):
     content_hash_to_s3key = {}
     processed_files = 0
     processed_bytes = 0
-    seen_paths = set()
-
-    for idx, (abs_path, drive_name) in enumerate(candidates, start=1):
-        if _interrupted:
-            safe_log("Interrupted flag set; stopping processing loop.")
-            break
-
-        if abs_path in seen_paths:
-            continue
-        seen_paths.add(abs_path)
-        processed_files += 1
+    last_progress = 0.0
+
+    # uploads run concurrently; their results are reaped on this thread so the
+    # bookkeeping below never needs a lock
+    upload_extra_args = {
+        "ServerSideEncryption": "aws:kms",
+        "SSEKMSKeyId": KMS_KEY_ARN,
+        "StorageClass": "DEEP_ARCHIVE"
+    }
+    upload_pool = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS)
+    inflight = {}  # future -> (abs_path, s3_key, file_hash, hash_entry, file_size, drive_name)
+    pending_dups = {}  # s3_key still uploading -> [(abs_path, hash_entry)] of its duplicates
+
+    def _record_hash(path, entry):
+        # upsert one row; commits are batched (and made again at the end of the run)
+        nonlocal hash_db, uncommitted_hashes
+        if hash_db is None:
+            return
         try:
-            file_size = os.path.getsize(abs_path)
-        except Exception:
-            file_size = 0
-
-        matched_source = None
-        for src in SOURCE_DRIVES.keys():
-            try:
-                if os.path.normcase(os.path.abspath(abs_path)).startswith(os.path.normcase(os.path.abspath(src))):
-                    matched_source = src
-                    break
-            except Exception:
-                pass
-        if matched_source:
-            try:
-                relpath = os.path.relpath(abs_path, matched_source)
-            except Exception:
-                relpath = os.path.basename(abs_path)
-        else:
-            relpath = os.path.basename(abs_path)
-
-        today_prefix = datetime.utcnow().strftime("%Y/%m/%d")
-        s3_key = f"{today_prefix}/{drive_name}/{relpath}".replace("\\", "/")
-
+            hash_db.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)", (path, entry[0], entry[1], entry[2]))
+            uncommitted_hashes += 1
+            if uncommitted_hashes >= HASH_DB_COMMIT_EVERY:
+                hash_db.commit()
+                uncommitted_hashes = 0
+        except sqlite3.Error as e:
+            safe_log(f"Failed writing hash DB, no further updates this run: {str(e)}")
+            run_manifest["errors"].append({"save_hash_db": str(e)})
+            hash_db.close()
+            hash_db = None
+
+    def _finish_upload(fut):
+        abs_path, s3_key, file_hash, hash_entry, file_size, drive_name = inflight.pop(fut)
+        waiting_dups = pending_dups.pop(s3_key, [])
+        if fut.cancelled():
+            # dropped after an interrupt; this file (and its duplicates) is retried next run
+            content_hash_to_s3key.pop(file_hash, None)
+            return
         try:
-            file_hash = compute_sha256(abs_path)
+            streamed_hash = fut.result()
         except Exception as e:
-            safe_log(f"ERROR hashing {mask_path_for_output(abs_path)}: {str(e)}")
+            safe_log(f"Failed upload {mask_path_for_output(abs_path)} -> {mask_s3_key(s3_key)}: {str(e)}")
             errors.append({"path": mask_path_for_output(abs_path), "error": str(e)})
             run_manifest["errors"].append({"path": mask_path_for_output(abs_path), "error": str(e)})
-            continue
+            # let a later copy of this content upload instead
+            content_hash_to_s3key.pop(file_hash, None)
+            return
+        if streamed_hash is not None:
+            # hashed while uploading (see upload_and_hash)
+            file_hash = streamed_hash
+            hash_entry[2] = streamed_hash
+        safe_log(f"Uploaded: {mask_path_for_output(abs_path)} -> s3://{mask_bucket(S3_BUCKET)}/{mask_s3_key(s3_key)} (DEEP_ARCHIVE)")
+        uploaded_keys.append(s3_key)
+        run_manifest["uploaded"].append({
+            "path": mask_path_for_output(abs_path),
+            "s3_key": mask_s3_key(s3_key),
+            "size_bytes": file_size,
+            "hash": file_hash,
+            "action": "uploaded"
+        })
+        _record_hash(abs_path, hash_entry)
+        for dup_path, dup_entry in waiting_dups:
+            _record_hash(dup_path, dup_entry)
+        drive_uploaded.setdefault(drive_name, 0)
+        drive_uploaded[drive_name] += 1
+
+    # candidate paths are already normcase(abspath(...)); normalize the roots once,
+    # with a trailing separator so a match is whole components and the relative
+    # path is a plain slice
+    norm_sources = []
+    for src in SOURCE_DRIVES:
+        norm_src = os.path.normcase(os.path.abspath(src))
+        norm_sources.append(norm_src if norm_src.endswith(os.sep) else norm_src + os.sep)
+    # one date prefix per run (also keeps a run that crosses midnight in one folder)
+    today_prefix = datetime.now(timezone.utc).strftime("%Y/%m/%d")
+
+    hashed = iter_hashed_candidates(candidates, persisted_hashes, size_counts)
+    loop_finished = False
+    try:
+        for abs_path, drive_name, fingerprint, hash_error in hashed:
+            if _interrupted:
+                safe_log("Interrupted flag set; stopping processing loop.")
+                break
 
-        if file_hash in content_hash_to_s3key:
-            existing_key = content_hash_to_s3key[file_hash]
-            safe_log(f"Duplicate content (this run), skipping upload: {mask_path_for_output(abs_path)} -> matches {mask_s3_key(existing_key)}")
-            duplicate_skips.append((mask_path_for_output(abs_path), mask_s3_key(existing_key)))
-            run_manifest["skipped_duplicates"].append({"path": mask_path_for_output(abs_path), "existing_s3_key": mask_s3_key(existing_key)})
-            updated_hashes[abs_path] = file_hash
-            continue
+            processed_files += 1
 
-        if persisted_hashes.get(abs_path) == file_hash:
-            safe_log(f"Unchanged, skipping upload: {mask_path_for_output(abs_path)}")
-            run_manifest.setdefault("unchanged", []).append(mask_path_for_output(abs_path))
-            continue
+            relpath = None
+            for norm_src in norm_sources:
+                if abs_path.startswith(norm_src):
+                    relpath = abs_path[len(norm_src):]
+                    break
+            if relpath is None:
+                relpath = os.path.basename(abs_path)
 
-        if dry_run:
-            safe_log(f"(dry) Would upload: {mask_path_for_output(abs_path)} -> s3://{mask_bucket(S3_BUCKET)}/{mask_s3_key(s3_key)} (DEEP_ARCHIVE)")
-            run_manifest["uploaded"].append({
-                "path": mask_path_for_output(abs_path),
-                "s3_key": mask_s3_key(s3_key),
-                "size_bytes": file_size,
-                "hash": file_hash,
-                "action": "dry_upload"
-            })
-            content_hash_to_s3key[file_hash] = s3_key
-            uploaded_keys.append(s3_key)
-            updated_hashes[abs_path] = file_hash
-            drive_uploaded.setdefault(drive_name, 0)
-            drive_uploaded[drive_name] += 1
-        else:
-            try:
-                s3.upload_file(
-                    Filename=abs_path,
-                    Bucket=S3_BUCKET,
-                    Key=s3_key,
-                    ExtraArgs={
-                        "ServerSideEncryption": "aws:kms",
-                        "SSEKMSKeyId": KMS_KEY_ARN,
-                        "StorageClass": "DEEP_ARCHIVE"
-                    }
-                )
-                safe_log(f"Uploaded: {mask_path_for_output(abs_path)} -> s3://{mask_bucket(S3_BUCKET)}/{mask_s3_key(s3_key)} (DEEP_ARCHIVE)")
-                uploaded_keys.append(s3_key)
-                content_hash_to_s3key[file_hash] = s3_key
+            s3_key = f"{today_prefix}/{drive_name}/{relpath}".replace("\\", "/")
+
+            if hash_error is not None:
+                e = hash_error
+                safe_log(f"ERROR hashing {mask_path_for_output(abs_path)}: {str(e)}")
+                errors.append({"path": mask_path_for_output(abs_path), "error": str(e)})
+                run_manifest["errors"].append({"path": mask_path_for_output(abs_path), "error": str(e)})
+                continue
+
+            file_size, mtime_ns, file_hash, presumed_unchanged = fingerprint
+            hash_entry = [file_size, mtime_ns, file_hash]
+
+            if presumed_unchanged:
+                # size and mtime match the hash DB. not added to content_hash_to_s3key:
+                # its object lives under an earlier date prefix, not today's s3_key
+                if persisted_hashes.get(abs_path) != hash_entry:
+                    # hash filled in (new algorithm, bare-hash migration, or newly needed)
+                    _record_hash(abs_path, hash_entry)
+                safe_log(f"Unchanged (size/mtime match), skipping upload: {mask_path_for_output(abs_path)}")
+                run_manifest.setdefault("unchanged", []).append(mask_path_for_output(abs_path))
+                continue
+
+            # file_hash is None for a changed file with a unique size: nothing to match
+            if file_hash is not None and file_hash in content_hash_to_s3key:
+                existing_key = content_hash_to_s3key[file_hash]
+                safe_log(f"Duplicate content (this run), skipping upload: {mask_path_for_output(abs_path)} -> matches {mask_s3_key(existing_key)}")
+                duplicate_skips.append((mask_path_for_output(abs_path), mask_s3_key(existing_key)))
+                run_manifest["skipped_duplicates"].append({"path": mask_path_for_output(abs_path), "existing_s3_key": mask_s3_key(existing_key)})
+                if existing_key in pending_dups:
+                    # only record it once the copy it matches has actually landed
+                    pending_dups[existing_key].append((abs_path, hash_entry))
+                else:
+                    _record_hash(abs_path, hash_entry)
+                continue
+
+            prev = persisted_hashes.get(abs_path)
+            prev_hash = prev[2] if isinstance(prev, list) and len(prev) == 3 else prev
+            if file_hash is not None and prev_hash == file_hash:
+                safe_log(f"Unchanged, skipping upload: {mask_path_for_output(abs_path)}")
+                run_manifest.setdefault("unchanged", []).append(mask_path_for_output(abs_path))
+                # refresh size/mtime so the next run can skip hashing this file
+                _record_hash(abs_path, hash_entry)
+                continue
+
+            if dry_run:
+                safe_log(f"(dry) Would upload: {mask_path_for_output(abs_path)} -> s3://{mask_bucket(S3_BUCKET)}/{mask_s3_key(s3_key)} (DEEP_ARCHIVE)")
                 run_manifest["uploaded"].append({
                     "path": mask_path_for_output(abs_path),
                     "s3_key": mask_s3_key(s3_key),
                     "size_bytes": file_size,
                     "hash": file_hash,
-                    "action": "uploaded"
+                    "action": "dry_upload"
                 })
-                updated_hashes[abs_path] = file_hash
+                if file_hash is not None:
+                    content_hash_to_s3key[file_hash] = s3_key
+                uploaded_keys.append(s3_key)
+                _record_hash(abs_path, hash_entry)
                 drive_uploaded.setdefault(drive_name, 0)
                 drive_uploaded[drive_name] += 1
+            else:
+                # claim the hash now so later duplicates don't upload while this one is in flight
+                if file_hash is not None:
+                    content_hash_to_s3key[file_hash] = s3_key
+                pending_dups[s3_key] = []
+                if file_hash is None and file_size < TRANSFER_CFG.multipart_threshold:
+                    # not hashed up front (unique size); boto3 buffers a single-part body
+                    # in memory anyway, so hash it on the way out instead of re-reading it
+                    fut = upload_pool.submit(upload_and_hash, abs_path, s3_key, upload_extra_args)
+                else:
+                    fut = upload_pool.submit(
+                        s3.upload_file,
+                        Filename=abs_path,
+                        Bucket=S3_BUCKET,
+                        Key=s3_key,
+                        ExtraArgs=upload_extra_args,
+                        Config=TRANSFER_CFG
+                    )
+                inflight[fut] = (abs_path, s3_key, file_hash, hash_entry, file_size, drive_name)
+                if len(inflight) >= 2 * UPLOAD_WORKERS:
+                    done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        _finish_upload(fut)
+
+            processed_bytes += file_size
+
+            # progress is rate-limited; logging every file costs more than the work
+            now = time.monotonic()
+            files_done = processed_files
+            if files_done > 0 and (now - last_progress >= PROGRESS_INTERVAL_SECONDS or files_done == total_files):
+                last_progress = now
+                elapsed = now - start_time
+                est_total = (elapsed / files_done) * total_files if total_files else elapsed
+                est_remaining = max(0.0, est_total - elapsed)
+                safe_log(f"Progress: {files_done}/{total_files} files. Elapsed {elapsed:.1f}s. Est remaining {est_remaining:.1f}s.")
+                run_manifest.setdefault("progress_samples", []).append({
+                    "time": datetime.now(timezone.utc).isoformat(),
+                    "processed_files": files_done,
+                    "elapsed_seconds": elapsed,
+                    "estimated_total_seconds": est_total,
+                    "estimated_remaining_seconds": est_remaining
+                })
+        loop_finished = True
+    finally:
+        # also reached if the loop raises: uploads already running are reaped
+        # so their hashes are recorded, and the hash DB is committed
+        hashed.close()
+        if _interrupted or not loop_finished:
+            for fut in inflight:
+                fut.cancel()
+        for fut in as_completed(list(inflight)):
+            _finish_upload(fut)
+        upload_pool.shutdown()
+
+        # Always attempt to commit the hash DB (even if interrupted or failed)
+        if hash_db is not None:
+            try:
+                hash_db.commit()
+                hash_db.close()
+                safe_log("Committed hash DB updates.")
             except Exception as e:
-                safe_log(f"Failed upload {mask_path_for_output(abs_path)} -> {mask_s3_key(s3_key)}: {str(e)}")
-                errors.append({"path": mask_path_for_output(abs_path), "error": str(e)})
-                run_manifest["errors"].append({"path": mask_path_for_output(abs_path), "error": str(e)})
-
-        processed_bytes += file_size
-
-        elapsed = time.time() - start_time
-        files_done = processed_files
-        if files_done > 0:
-            est_total = (elapsed / files_done) * total_files if total_files else elapsed
-            est_remaining = max(0.0, est_total - elapsed)
-            safe_log(f"Progress: {files_done}/{total_files} files. Elapsed {elapsed:.1f}s. Est remaining {est_remaining:.1f}s.")
-            run_manifest.setdefault("progress_samples", []).append({
-                "time": datetime.utcnow().replace(tzinfo=timezone.utc).isoformat(),
-                "processed_files": files_done,
-                "elapsed_seconds": elapsed,
-                "estimated_total_seconds": est_total,
-                "estimated_remaining_seconds": est_remaining
-            })
+                safe_log(f"Failed saving hash DB: {str(e)}")
+                run_manifest["errors"].append({"save_hash_db": str(e)})
 
     # finish
-    end_time = time.time()
+    end_time = time.monotonic()
     duration = end_time - start_time
 
-    run_manifest["run_end_utc"] = datetime.utcnow().replace(tzinfo=timezone.utc).isoformat()
+    run_manifest["run_end_utc"] = datetime.now(timezone.utc).isoformat()
     run_manifest["duration_seconds"] = duration
     run_manifest["files_uploaded_count"] = len(uploaded_keys)
     run_manifest["files_processed_count"] = processed_files
     run_manifest["bytes_processed"] = processed_bytes
     run_manifest["interrupted"] = bool(_interrupted)
 
-    # Always attempt to save updated hash DB (even if interrupted)
-    if not dry_run:
-        try:
-            save_hash_db_atomic(updated_hashes)
-            safe_log("Saved updated hash DB (atomic).")
-        except Exception as e:
-            safe_log(f"Failed saving hash DB: {str(e)}")
-            run_manifest["errors"].append({"save_hash_db": str(e)})
-
     # compute bucket size for cost estimate (best-effort)
     readable_size = "unknown"
     estimated_cost = 0.0
     if not dry_run:
         try:
-            total_bytes_bucket = 0
-            paginator = s3.get_paginator("list_objects_v2")
-            for page in paginator.paginate(Bucket=S3_BUCKET):
-                for obj in page.get("Contents", []):
-                    total_bytes_bucket += obj.get("Size", 0)
+            total_bytes_bucket = get_bucket_size_bytes()
             readable_size = human_readable_size(total_bytes_bucket)
             total_gb = total_bytes_bucket / (1024 ** 3)
             estimated_cost = total_gb * PRICE_PER_GB_DEEP_ARCHIVE
@@ -544,10 +1102,7 @@ if __name__ == "__main__":
     if not args.skip_prewarn:
         safe_log("Pre-warn: backup will start in 5 minutes (skipped showing exact drive/bucket info in logs)")
         try:
-            for _ in range(PREWARN_SECONDS):
-                if _interrupted:
-                    break
-                time.sleep(1)
+            wait_for_interrupt(PREWARN_SECONDS)
         except KeyboardInterrupt:
             _interrupted = True
             safe_log("Interrupted during pre-warn sleep.")
@@ -585,7 +1140,7 @@ if __name__ == "__main__":
     if report.get("interrupted"):
         status = "Interrupted" if status != "Failed" else "Failed (Interrupted)"
 
-    subj_time = format_local_time_for_email(datetime.utcnow().replace(tzinfo=timezone.utc))
+    subj_time = format_local_time_for_email(datetime.now(timezone.utc))
     subject = f"Backup {status} — {subj_time}"
 
     lines = []
@@ -606,7 +1161,7 @@ if __name__ == "__main__":
         lines.append("Errors / Notes:")
         for e in report.get("errors", []):
             if isinstance(e, dict):
-                lines.append(f" - {json.dumps(e)}")
+                lines.append(f" - {json_dumps(e).decode('utf-8')}")
             else:
                 lines.append(f" - {str(e)}")
         lines.append("")
@@ -630,9 +1185,9 @@ if __name__ == "__main__":
 
     # write a masked manifest for portfolio or review (never contain raw absolute paths / ARNs)
     try:
-        masked_manifest_fn = os.path.join(BASE_DIR, f"backup_manifest_masked_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json")
-        with open(masked_manifest_fn, "w", encoding="utf-8") as mf:
-            json.dump({
+        masked_manifest_fn = os.path.join(BASE_DIR, f"backup_manifest_masked_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.json")
+        with open(masked_manifest_fn, "wb") as mf:
+            mf.write(json_dumps({
                 "run": run_manifest,
                 "report": report,
                 "config_masks": {
@@ -640,7 +1195,7 @@ if __name__ == "__main__":
                     "kms": mask_arn(KMS_KEY_ARN),
                     "sns": "<REDACTED_SNS>"
                 }
-            }, mf, indent=2)
+            }, indent=True))
         safe_log(f"Wrote masked run manifest: {mask_path_for_output(masked_manifest_fn)}")
     except Exception as e:
         safe_log(f"Failed to write masked manifest file: {str(e)}")